@@ -4,15 +4,19 @@ This script uses the generic shapefile_pipeline library for coordinate extractio
 and adds GEBCO raster sampling and Spirit-specific output on top.
 """
 
-import csv
-import math
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
 import rasterio
-from pyproj import Transformer
+from rasterio.transform import rowcol
+from rasterio.windows import Window
 
-from shapefile_pipeline import read_shapefile
+from shapefile_pipeline import ShapefileMetadata, get_transformer, read_shapefile
 
 SHAPEFILE = Path(__file__).parent / "sampledata" / "spirit" / "KP_Points" / "KP_Points_1m"
 GEBCO_RASTER = Path(__file__).parent / "gebco" / "gebco_2025_n54.0_s53.3_w-3.7_e-3.0_geotiff.tif"
@@ -20,103 +24,222 @@ OUTPUT_CSV = Path(__file__).parent / "pipeline_segments.csv"
 OUTPUT_PLOT = Path(__file__).parent / "pipeline_profile.png"
 
 
-def sample_gebco(points: list[dict], raster_path: Path, source_epsg: int = 23030) -> list[float | None]:
-    """Sample GEBCO elevation at each pipeline point by transforming from source CRS to WGS84."""
-    transformer = Transformer.from_crs(f"EPSG:{source_epsg}", "EPSG:4326", always_xy=True)
-    eastings = [p["easting"] for p in points]
-    northings = [p["northing"] for p in points]
-    lons, lats = transformer.transform(eastings, northings)
-
-    elevations: list[float | None] = []
-    with rasterio.open(raster_path) as ds:
-        band = ds.read(1)
-        nodata = ds.nodata
-        for lon, lat in zip(lons, lats):
-            try:
-                row, col = ds.index(lon, lat)
-                if 0 <= row < band.shape[0] and 0 <= col < band.shape[1]:
-                    val = float(band[row, col])
-                    elevations.append(None if nodata is not None and val == nodata else val)
-                else:
-                    elevations.append(None)
-            except Exception:
-                elevations.append(None)
-    return elevations
-
-
-def compute_segments(points: list[dict], gebco_elevations: list[float | None] | None = None) -> list[dict]:
-    """Compute segment data between consecutive points (Spirit-specific with GEBCO columns)."""
-    segments = []
-    cumulative_km = 0.0
-    for i in range(1, len(points)):
-        p1, p2 = points[i - 1], points[i]
-        dx = p2["easting"] - p1["easting"]
-        dy = p2["northing"] - p1["northing"]
-        length = math.hypot(dx, dy)
-        elev_change = p2["depth_m"] - p1["depth_m"]
-        seg = {
-            "segment": f"{i} -> {i + 1}",
-            "start_point": i,
-            "end_point": i + 1,
-            "start_easting": p1["easting"],
-            "start_northing": p1["northing"],
-            "end_easting": p2["easting"],
-            "end_northing": p2["northing"],
-            "start_depth_m": p1["depth_m"],
-            "end_depth_m": p2["depth_m"],
-            "start_gebco_m": gebco_elevations[i - 1] if gebco_elevations else None,
-            "end_gebco_m": gebco_elevations[i] if gebco_elevations else None,
-            "elev_change_m": elev_change,
-            "gebco_elev_change_m": (
-                gebco_elevations[i] - gebco_elevations[i - 1]
-                if gebco_elevations and gebco_elevations[i] is not None and gebco_elevations[i - 1] is not None
-                else None
-            ),
-            "length_m": length,
-            "length_km": length / 1000,
-            "cumulative_km_start": cumulative_km,
-            "cumulative_km_end": cumulative_km + length / 1000,
-        }
-        segments.append(seg)
-        cumulative_km += length / 1000
-    return segments
-
-
-def export_csv(segments: list[dict], path: Path) -> None:
-    """Write segments to a CSV file."""
-    fieldnames = list(segments[0].keys())
-    with open(path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(segments)
+@dataclass
+class PipelinePoints:
+    """Pipeline survey points as parallel numpy arrays (SoA).
+
+    ``gebco_m`` holds NaN where the raster has no coverage, so elevation
+    arithmetic propagates missing values without branching.
+    """
+
+    easting: np.ndarray
+    northing: np.ndarray
+    depth_m: np.ndarray
+    gebco_m: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return self.easting.size
+
+
+# Below this many points the thread-pool dispatch overhead outweighs the win.
+_MIN_CHUNK = 16_384
+
+
+def sample_gebco(
+    points: PipelinePoints,
+    raster_path: Path,
+    source_epsg: int = 23030,
+    max_workers: int | None = None,
+) -> np.ndarray:
+    """Sample GEBCO elevation at each pipeline point by transforming from source CRS to WGS84.
+
+    The point array is split across a thread pool — both pyproj's transform
+    and rasterio's windowed reads release the GIL, so chunks run on all
+    cores. Each worker opens its own dataset handle (DatasetReader is not
+    safe to share between threads). Returns a float64 array with NaN for
+    nodata / out-of-coverage points.
+    """
+    n = len(points)
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    workers = max(1, min(workers, n // _MIN_CHUNK + 1))
+
+    def _worker(start: int, end: int) -> np.ndarray:
+        transformer = get_transformer(source_epsg)
+        lons, lats = transformer.transform(points.easting[start:end], points.northing[start:end])
+        with rasterio.open(raster_path) as ds:
+            return _sample_block_grouped(ds, lons, lats)
+
+    if workers == 1:
+        return _worker(0, n)
+
+    bounds = np.linspace(0, n, workers + 1).astype(int).tolist()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = executor.map(_worker, bounds[:-1], bounds[1:])
+    return np.concatenate(list(parts))
+
+
+def _sample_block_grouped(ds: rasterio.DatasetReader, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Sample one band at (lon, lat) queries, grouped by raster block.
+
+    Queries are sorted by their (block_row, block_col) and each touched block
+    is read exactly once as a window, then indexed in memory — no per-point
+    raster access.
+    """
+    out = np.full(lons.size, np.nan, dtype=np.float64)
+    rows, cols = rowcol(ds.transform, lons, lats)
+    rows = np.asarray(rows)
+    cols = np.asarray(cols)
+    inside = (rows >= 0) & (rows < ds.height) & (cols >= 0) & (cols < ds.width)
+
+    bh, bw = ds.block_shapes[0]
+    brow = rows // bh
+    bcol = cols // bw
+
+    idx = np.flatnonzero(inside)
+    order = idx[np.lexsort((bcol[idx], brow[idx]))]
+    if order.size == 0:
+        return out
+
+    # Group boundaries between runs of identical (block_row, block_col)
+    keys = brow[order] * (ds.width // bw + 1) + bcol[order]
+    boundaries = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate(([0], boundaries)).tolist()
+    ends = np.concatenate((boundaries, [order.size])).tolist()
+
+    nodata = ds.nodata
+    for s, e in zip(starts, ends):
+        sel = order[s:e]
+        r0 = int(brow[sel[0]]) * bh
+        c0 = int(bcol[sel[0]]) * bw
+        window = Window(c0, r0, min(bw, ds.width - c0), min(bh, ds.height - r0))
+        tile = ds.read(1, window=window)
+        vals = tile[rows[sel] - r0, cols[sel] - c0].astype(np.float64)
+        if nodata is not None:
+            vals[vals == nodata] = np.nan
+        out[sel] = vals
+    return out
+
+
+def compute_segments(points: PipelinePoints) -> dict[str, np.ndarray]:
+    """Compute segment columns between consecutive points (Spirit-specific with GEBCO columns).
+
+    Returns a dict of parallel arrays, one entry per CSV column, each of
+    length ``len(points) - 1``.
+    """
+    n = len(points)
+    start = np.arange(1, n)
+    end = start + 1
+
+    lengths = np.hypot(np.diff(points.easting), np.diff(points.northing))
+    lengths_km = lengths / 1000.0
+    cum_end = np.cumsum(lengths_km)
+    cum_start = np.concatenate(([0.0], cum_end[:-1]))
+
+    gebco = points.gebco_m if points.gebco_m is not None else np.full(n, np.nan)
+    start_str = start.astype(np.str_)
+    end_str = end.astype(np.str_)
+
+    return {
+        "segment": np.char.add(np.char.add(start_str, " -> "), end_str),
+        "start_point": start,
+        "end_point": end,
+        "start_easting": points.easting[:-1],
+        "start_northing": points.northing[:-1],
+        "end_easting": points.easting[1:],
+        "end_northing": points.northing[1:],
+        "start_depth_m": points.depth_m[:-1],
+        "end_depth_m": points.depth_m[1:],
+        "start_gebco_m": gebco[:-1],
+        "end_gebco_m": gebco[1:],
+        "elev_change_m": np.diff(points.depth_m),
+        "gebco_elev_change_m": np.diff(gebco),
+        "length_m": lengths,
+        "length_km": lengths_km,
+        "cumulative_km_start": cum_start,
+        "cumulative_km_end": cum_end,
+    }
+
+
+def _format_column(col: np.ndarray) -> np.ndarray:
+    """Render a column as strings; NaN becomes the empty cell."""
+    cells = col.astype(np.str_)
+    if col.dtype.kind == "f":
+        return np.where(np.isnan(col), "", cells)
+    return cells
+
+
+def export_csv(segments: dict[str, np.ndarray], path: Path) -> None:
+    """Write segment columns to a CSV file in a single buffered write.
+
+    Formatting happens column-wise in numpy rather than row-by-row through
+    csv.DictWriter; no value here needs quoting, so plain joins suffice.
+    """
+    columns = [_format_column(col) for col in segments.values()]
+    rows = columns[0]
+    for col in columns[1:]:
+        rows = np.char.add(np.char.add(rows, ","), col)
+    header = ",".join(segments.keys())
+    path.write_text(header + "\n" + "\n".join(rows.tolist()) + "\n")
     print(f"CSV exported: {path}")
 
 
+# Profile plots are decimated to about this many vertices — indistinguishable
+# at 150 dpi on a 14-inch-wide figure, and far cheaper to rasterize.
+_MAX_PLOT_POINTS = 5_000
+
+
+def _decimate_minmax(kp: np.ndarray, values: np.ndarray, max_points: int = _MAX_PLOT_POINTS):
+    """Reduce a profile to roughly ``max_points`` while preserving its silhouette.
+
+    Buckets the series and keeps the minimum and maximum sample of each
+    bucket, so peaks and troughs survive where a plain stride would skip them.
+    """
+    n = kp.size
+    if n <= max_points:
+        return kp, values
+
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(int)
+    keep: list[int] = []
+    for s, e in zip(edges[:-1].tolist(), edges[1:].tolist()):
+        bucket = values[s:e]
+        if bucket.size == 0 or np.isnan(bucket).all():
+            continue
+        lo = s + int(np.nanargmin(bucket))
+        hi = s + int(np.nanargmax(bucket))
+        keep.extend((lo, hi) if lo <= hi else (hi, lo))
+    keep_idx = np.unique(np.array(keep, dtype=np.intp))
+    return kp[keep_idx], values[keep_idx]
+
+
 def plot_profile(
-    points: list[dict],
-    segments: list[dict],
+    points: PipelinePoints,
+    segments: dict[str, np.ndarray],
     path: Path,
-    gebco_elevations: list[float | None] | None = None,
     title: str = "Pipeline Bathymetry Profile",
 ) -> None:
     """Generate a high-resolution depth profile plot."""
-    kp = [0.0] + [s["cumulative_km_end"] for s in segments]
-    depths = [p["depth_m"] for p in points]
+    kp = np.concatenate(([0.0], segments["cumulative_km_end"]))
+    depths = points.depth_m
 
+    plt.style.use("fast")
     fig, ax = plt.subplots(figsize=(14, 5))
-    ax.fill_between(kp, depths, alpha=0.3, color="steelblue", label="Survey (1m)")
-    ax.plot(kp, depths, color="steelblue", linewidth=0.5)
+    kp_d, depths_d = _decimate_minmax(kp, depths)
+    ax.fill_between(kp_d, depths_d, alpha=0.3, color="steelblue", label="Survey (1m)")
+    ax.plot(kp_d, depths_d, color="steelblue", linewidth=0.5)
 
-    if gebco_elevations:
-        ax.plot(kp, gebco_elevations, color="coral", linewidth=1.2, label="GEBCO 2025 (~450m)")
+    gebco = points.gebco_m
+    has_gebco = gebco is not None and not np.isnan(gebco).all()
+    if has_gebco:
+        kp_g, gebco_d = _decimate_minmax(kp, gebco)
+        ax.plot(kp_g, gebco_d, color="coral", linewidth=1.2, label="GEBCO 2025 (~450m)")
 
     ax.set_xlabel("KP (km)")
     ax.set_ylabel("Depth (m)")
     ax.set_title(title)
     ax.axhline(0, color="black", linewidth=0.5, linestyle="--", alpha=0.5)
 
-    all_depths = depths + [v for v in (gebco_elevations or []) if v is not None]
-    ax.set_ylim(min(all_depths) - 5, max(all_depths) + 5)
+    all_depths = np.concatenate((depths, gebco[~np.isnan(gebco)])) if has_gebco else depths
+    ax.set_ylim(all_depths.min() - 5, all_depths.max() + 5)
     ax.grid(True, alpha=0.3)
     ax.legend()
     fig.tight_layout()
@@ -124,46 +247,96 @@ def plot_profile(
     print(f"Plot saved: {path}")
 
 
+def _load_points(shapefile_path: Path, use_cache: bool = True) -> tuple[PipelinePoints, ShapefileMetadata]:
+    """Read the survey shapefile into SoA arrays, via an ``.npz`` sidecar cache.
+
+    The sidecar stores the extracted arrays keyed on the .shp mtime, so warm
+    runs skip pyshp parsing and CRS detection entirely. ``use_cache=False``
+    forces a rebuild.
+    """
+    cache_path = shapefile_path.with_suffix(".npz")
+    mtime = Path(str(shapefile_path) + ".shp").stat().st_mtime
+
+    if use_cache and cache_path.exists():
+        cached = np.load(cache_path)
+        if float(cached["mtime"]) == mtime:
+            points = PipelinePoints(
+                easting=cached["easting"],
+                northing=cached["northing"],
+                depth_m=cached["depth_m"],
+            )
+            epsg = int(cached["crs_epsg"])
+            metadata = ShapefileMetadata(
+                shape_type_name=str(cached["shape_type_name"]),
+                crs_epsg=epsg if epsg >= 0 else None,
+                crs_name=str(cached["crs_name"]) or None,
+                is_projected=bool(cached["is_projected"]),
+                num_points=len(points),
+                has_z=True,
+                fields=[],
+            )
+            return points, metadata
+
+    coord_points, metadata = read_shapefile(shapefile_path)
+    n = len(coord_points)
+    points = PipelinePoints(
+        easting=np.fromiter((p.x for p in coord_points), dtype=np.float64, count=n),
+        northing=np.fromiter((p.y for p in coord_points), dtype=np.float64, count=n),
+        depth_m=np.fromiter((p.z if p.z is not None else np.nan for p in coord_points), dtype=np.float64, count=n),
+    )
+    np.savez(
+        cache_path,
+        easting=points.easting,
+        northing=points.northing,
+        depth_m=points.depth_m,
+        mtime=mtime,
+        crs_epsg=metadata.crs_epsg if metadata.crs_epsg is not None else -1,
+        crs_name=metadata.crs_name or "",
+        shape_type_name=metadata.shape_type_name,
+        is_projected=bool(metadata.is_projected),
+    )
+    return points, metadata
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Extract pipeline bathymetry from the KP_Points_1m shapefile.")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and rebuild the .npz sidecar cache")
+    args = parser.parse_args()
+
     print(f"Reading shapefile: {SHAPEFILE}.shp\n")
-    coord_points, metadata = read_shapefile(SHAPEFILE)
-    print(f"Loaded {len(coord_points):,} points")
+    points, metadata = _load_points(SHAPEFILE, use_cache=not args.no_cache)
+    print(f"Loaded {len(points):,} points")
     print(f"Shape type: {metadata.shape_type_name}, CRS: EPSG:{metadata.crs_epsg} ({metadata.crs_name})\n")
 
-    # Convert CoordinatePoints to legacy dict format for GEBCO pipeline
-    points = [{"easting": p.x, "northing": p.y, "depth_m": p.z} for p in coord_points]
-
     # Determine source EPSG for GEBCO sampling
     source_epsg = metadata.crs_epsg or 23030
 
     # Sample GEBCO elevations
-    gebco_elevations = None
     if GEBCO_RASTER.exists():
         print(f"Sampling GEBCO raster: {GEBCO_RASTER.name}")
-        gebco_elevations = sample_gebco(points, GEBCO_RASTER, source_epsg=source_epsg)
-        sampled = [v for v in gebco_elevations if v is not None]
-        print(f"GEBCO coverage: {len(sampled):,} / {len(points):,} points sampled")
-        if sampled:
-            print(f"GEBCO range:   {min(sampled):.1f} m  to  {max(sampled):.1f} m")
+        points.gebco_m = sample_gebco(points, GEBCO_RASTER, source_epsg=source_epsg)
+        sampled = points.gebco_m[~np.isnan(points.gebco_m)]
+        print(f"GEBCO coverage: {sampled.size:,} / {len(points):,} points sampled")
+        if sampled.size:
+            print(f"GEBCO range:   {sampled.min():.1f} m  to  {sampled.max():.1f} m")
         print()
     else:
         print(f"GEBCO raster not found at {GEBCO_RASTER}, skipping.\n")
 
-    segments = compute_segments(points, gebco_elevations)
+    segments = compute_segments(points)
 
-    total_length_m = sum(s["length_m"] for s in segments)
-    depths = [p["depth_m"] for p in points]
+    total_length_m = segments["length_m"].sum()
 
     print(f"Total length:  {total_length_m:,.1f} m  ({total_length_m / 1000:.2f} km)")
-    print(f"Depth range:   {min(depths):.1f} m  to  {max(depths):.1f} m")
+    print(f"Depth range:   {points.depth_m.min():.1f} m  to  {points.depth_m.max():.1f} m")
     print(f"Point count:   {len(points):,}")
-    print(f"Segments:      {len(segments):,}")
+    print(f"Segments:      {segments['length_m'].size:,}")
     print()
 
     export_csv(segments, OUTPUT_CSV)
 
     title = f"Pipeline Bathymetry Profile — {metadata.crs_name or 'Unknown CRS'} (1m resolution)"
-    plot_profile(points, segments, OUTPUT_PLOT, gebco_elevations, title=title)
+    plot_profile(points, segments, OUTPUT_PLOT, title=title)
 
 
 if __name__ == "__main__":
@@ -1,17 +1,21 @@
 """Generic shapefile-to-CSV pipeline library."""
 
-from .kml_reader import read_kmz
+from .kml_reader import read_kml, read_kmz
 from .models import CoordinatePoint, PipelineResult, Segment, ShapefileMetadata
-from .reader import detect_crs, read_shapefile
-from .segments import compute_segments
+from .reader import detect_crs, get_transformer, read_shapefile
+from .segments import compute_segment_columns, compute_segments, haversine_lengths
 
 __all__ = [
     "CoordinatePoint",
     "PipelineResult",
     "Segment",
     "ShapefileMetadata",
+    "compute_segment_columns",
     "compute_segments",
     "detect_crs",
+    "get_transformer",
+    "haversine_lengths",
+    "read_kml",
     "read_kmz",
     "read_shapefile",
 ]
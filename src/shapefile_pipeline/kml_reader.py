@@ -11,6 +11,8 @@ import zipfile
 import xml.etree.ElementTree as ET
 from typing import BinaryIO
 
+import numpy as np
+
 from .models import CoordinatePoint, ShapefileMetadata
 
 KML_NS = "{http://www.opengis.net/kml/2.2}"
@@ -28,19 +30,26 @@ def read_kmz(
 
     # KMZ is a ZIP; plain KML is XML text
     if _is_zip(data):
-        kml_text = _extract_kml_from_kmz(data)
-    else:
-        kml_text = data.decode("utf-8", errors="replace")
+        return _from_kml_bytes(_extract_kml_from_kmz(data))
+    return _from_kml_bytes(data)
 
-    root = ET.fromstring(kml_text)
-    points, geometry_type = _extract_coordinates(root)
 
-    has_z = any(p.z is not None for p in points)
+def read_kml(
+    file: str | BinaryIO,
+) -> tuple[list[CoordinatePoint], ShapefileMetadata]:
+    """Read a plain KML file and return coordinate points with metadata.
+
+    Skips the zip sniff/extract branch of ``read_kmz`` for callers that
+    already know the payload is XML.
+    """
+    return _from_kml_bytes(_read_bytes(file))
 
-    # KML is always WGS84 — populate lon/lat from x/y (they're the same in KML)
-    for p in points:
-        p.lon = p.x
-        p.lat = p.y
+
+def _from_kml_bytes(kml_bytes: bytes) -> tuple[list[CoordinatePoint], ShapefileMetadata]:
+    """Extract points and metadata from raw KML bytes."""
+    points, geometry_type = _extract_coordinates(io.BytesIO(kml_bytes))
+
+    has_z = any(p.z is not None for p in points)
 
     metadata = ShapefileMetadata(
         shape_type_name=f"KML_{geometry_type}",
@@ -67,7 +76,7 @@ def _is_zip(data: bytes) -> bool:
     return data[:4] == b"PK\x03\x04"
 
 
-def _extract_kml_from_kmz(data: bytes) -> str:
+def _extract_kml_from_kmz(data: bytes) -> bytes:
     """Extract the first .kml file from a KMZ (ZIP) archive."""
     with zipfile.ZipFile(io.BytesIO(data)) as zf:
         # Prefer doc.kml, fall back to any .kml
@@ -84,18 +93,23 @@ def _extract_kml_from_kmz(data: bytes) -> str:
                     break
         if kml_name is None:
             raise ValueError("No .kml file found in KMZ archive")
-        return zf.read(kml_name).decode("utf-8", errors="replace")
+        return zf.read(kml_name)
 
 
-def _extract_coordinates(root: ET.Element) -> tuple[list[CoordinatePoint], str]:
-    """Walk the KML tree and extract coordinates from all geometry elements."""
+def _extract_coordinates(stream: BinaryIO) -> tuple[list[CoordinatePoint], str]:
+    """Stream-parse the KML and extract coordinates from all geometry elements.
+
+    Uses ``iterparse`` with eager ``clear()`` so the full DOM is never held in
+    memory — only the geometry element currently being processed.
+    """
     points: list[CoordinatePoint] = []
     geometry_type = "UNKNOWN"
     idx = 1
 
-    # Search for all <coordinates> elements under supported geometry types
-    # KML geometry: Point, LineString, LinearRing (inside Polygon)
-    for elem in root.iter():
+    # Supported geometry: Point, LineString, LinearRing (inside Polygon).
+    # "end" events fire once a geometry subtree is complete, so its
+    # <coordinates> child is fully parsed when we look at it.
+    for _, elem in ET.iterparse(stream, events=("end",)):
         tag = elem.tag.replace(KML_NS, "")
 
         if tag in ("LineString", "LinearRing"):
@@ -105,6 +119,7 @@ def _extract_coordinates(root: ET.Element) -> tuple[list[CoordinatePoint], str]:
                 for pt in _parse_coordinates_text(coords_elem.text, idx):
                     points.append(pt)
                     idx += 1
+            elem.clear()
 
         elif tag == "Point":
             if geometry_type == "UNKNOWN":
@@ -114,6 +129,12 @@ def _extract_coordinates(root: ET.Element) -> tuple[list[CoordinatePoint], str]:
                 for pt in _parse_coordinates_text(coords_elem.text, idx):
                     points.append(pt)
                     idx += 1
+            elem.clear()
+
+        elif tag == "Placemark":
+            # Geometry children were already consumed — drop the empty shell
+            # so ancestors don't accumulate processed subtrees.
+            elem.clear()
 
     if geometry_type == "UNKNOWN" and points:
         geometry_type = "MIXED"
@@ -125,17 +146,49 @@ def _parse_coordinates_text(text: str, start_idx: int) -> list[CoordinatePoint]:
     """Parse a KML ``<coordinates>`` text block.
 
     Format: ``lon,lat[,alt] lon,lat[,alt] ...`` (whitespace-separated tuples).
+    Uniform blocks convert through a single numpy float parse; ragged or
+    malformed blocks fall back to per-token parsing.
     """
+    tokens = text.split()
+    if not tokens:
+        return []
+
+    ncols = tokens[0].count(",") + 1
+    if ncols >= 2:
+        try:
+            arr = np.array(text.replace(",", " ").split(), dtype=np.float64).reshape(-1, ncols)
+        except ValueError:
+            pass
+        else:
+            if arr.shape[0] != len(tokens):
+                # Mixed-arity tuples whose total value count happens to be
+                # divisible by ncols reshape "successfully" into garbage —
+                # rows must match the tuple count for the parse to be valid
+                return _parse_coordinates_slow(tokens, start_idx)
+            lons = arr[:, 0].tolist()
+            lats = arr[:, 1].tolist()
+            alts = arr[:, 2].tolist() if ncols >= 3 else [None] * len(lons)
+            # In KML, x=lon, y=lat (geographic coordinates, always WGS84)
+            return [
+                CoordinatePoint.model_construct(index=i, x=lon, y=lat, z=alt, lon=lon, lat=lat)
+                for i, (lon, lat, alt) in enumerate(zip(lons, lats, alts), start=start_idx)
+            ]
+
+    return _parse_coordinates_slow(tokens, start_idx)
+
+
+def _parse_coordinates_slow(tokens: list[str], start_idx: int) -> list[CoordinatePoint]:
+    """Token-at-a-time fallback for non-uniform coordinate tuples."""
     points: list[CoordinatePoint] = []
     idx = start_idx
-    for token in text.strip().split():
+    for token in tokens:
         parts = token.split(",")
         if len(parts) < 2:
             continue
         lon = float(parts[0])
         lat = float(parts[1])
         alt = float(parts[2]) if len(parts) >= 3 else None
-        # In KML, x=lon, y=lat (geographic coordinates)
-        points.append(CoordinatePoint(index=idx, x=lon, y=lat, z=alt))
+        # In KML, x=lon, y=lat (geographic coordinates, always WGS84)
+        points.append(CoordinatePoint(index=idx, x=lon, y=lat, z=alt, lon=lon, lat=lat))
         idx += 1
     return points
@@ -2,16 +2,45 @@
 
 from __future__ import annotations
 
+import functools
 import io
 from pathlib import Path
 from typing import BinaryIO
 
+import numpy as np
 import shapefile
 from pyproj import CRS, Transformer
 
 from .models import CoordinatePoint, ShapefileMetadata
 
 
+@functools.lru_cache(maxsize=32)
+def get_transformer(src_epsg: int, dst_epsg: int = 4326) -> Transformer:
+    """Return a cached ``always_xy`` Transformer between two EPSG codes.
+
+    Transformer construction walks the PROJ CRS graph and is expensive;
+    server workloads hit the same source EPSG over and over, so memoize
+    per (src, dst) pair. pyproj Transformers are safe to share between
+    threads.
+    """
+    return Transformer.from_crs(f"EPSG:{src_epsg}", f"EPSG:{dst_epsg}", always_xy=True)
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_prj_wkt(wkt: str) -> tuple[int | None, str | None, bool | None]:
+    """Parse a .prj WKT into (epsg, name, is_projected), cached per WKT string.
+
+    CRS.from_wkt and the EPSG lookup are expensive; repeated uploads of the
+    same projection (the common server case) short-circuit here.
+    """
+    try:
+        crs = CRS.from_wkt(wkt)
+    except Exception:
+        return None, None, None
+
+    return crs.to_epsg(), crs.name, crs.is_projected
+
+
 def detect_crs(prj_source: str | Path | None) -> tuple[int | None, str | None, bool | None]:
     """Parse CRS from a .prj WKT string or file path.
 
@@ -29,13 +58,7 @@ def detect_crs(prj_source: str | Path | None) -> tuple[int | None, str | None, b
     if not wkt.strip():
         return None, None, None
 
-    try:
-        crs = CRS.from_wkt(wkt)
-    except Exception:
-        return None, None, None
-
-    epsg = crs.to_epsg()
-    return epsg, crs.name, crs.is_projected
+    return _parse_prj_wkt(wkt)
 
 
 def read_shapefile(
@@ -93,41 +116,64 @@ def read_shapefile(
 
 
 def _extract_points(sf: shapefile.Reader, upper_type: str, has_z: bool) -> list[CoordinatePoint]:
-    """Extract CoordinatePoints from shapes based on shape type."""
-    points: list[CoordinatePoint] = []
-    idx = 1
+    """Extract CoordinatePoints from shapes based on shape type.
+
+    Vertices are gathered into flat numpy buffers per shape, then materialized
+    with ``model_construct`` in one pass — per-point pydantic validation is the
+    dominant cost on large (10^5+ vertex) inputs.
+    """
+    xs_parts: list[np.ndarray] = []
+    ys_parts: list[np.ndarray] = []
+    zs_parts: list[np.ndarray] = []
 
     if "POINT" in upper_type and "POLY" not in upper_type:
-        # POINT / POINTZ / POINTM
-        for shape in sf.shapes():
-            x, y = shape.points[0]
-            z = shape.z[0] if has_z else None
-            points.append(CoordinatePoint(index=idx, x=x, y=y, z=z))
-            idx += 1
+        # POINT / POINTZ / POINTM — gather every record's coordinates first,
+        # then convert once; one C-level parse instead of one array per shape
+        rows: list = []
+        for shape in sf.iterShapes():
+            rows.extend(shape.points)
+            if has_z:
+                zs_parts.append(np.asarray(shape.z, dtype=np.float64))
+        if rows:
+            pts = np.asarray(rows, dtype=np.float64)
+            xs_parts.append(pts[:, 0])
+            ys_parts.append(pts[:, 1])
     elif "POLYLINE" in upper_type or upper_type in ("ARC", "ARCZ", "ARCM"):
-        # POLYLINE / POLYLINEZ — extract all vertices across all records and parts
-        for shape in sf.shapes():
-            part_starts = list(shape.parts)
-            for part_idx in range(len(part_starts)):
-                start = part_starts[part_idx]
-                end = part_starts[part_idx + 1] if part_idx + 1 < len(part_starts) else len(shape.points)
-                for v in range(start, end):
-                    x, y = shape.points[v]
-                    z = shape.z[v] if has_z and hasattr(shape, "z") and len(shape.z) > v else None
-                    points.append(CoordinatePoint(index=idx, x=x, y=y, z=z))
-                    idx += 1
+        # POLYLINE / POLYLINEZ — extract all vertices across all records.
+        # Parts are contiguous ordered slices of shape.points and we consume
+        # every vertex in file order, so splitting on part boundaries just to
+        # re-concatenate them is wasted work.
+        for shape in sf.iterShapes():
+            pts = np.asarray(shape.points, dtype=np.float64)
+            if pts.size == 0:
+                continue
+            xs_parts.append(pts[:, 0])
+            ys_parts.append(pts[:, 1])
+            if has_z and hasattr(shape, "z"):
+                zs_parts.append(np.asarray(shape.z, dtype=np.float64))
     else:
         raise ValueError(f"Unsupported shape type: {upper_type}")
 
-    return points
+    xs = np.concatenate(xs_parts) if xs_parts else np.empty(0, dtype=np.float64)
+    ys = np.concatenate(ys_parts) if ys_parts else np.empty(0, dtype=np.float64)
+    if zs_parts:
+        z_list: list[float | None] = np.concatenate(zs_parts).tolist()
+    else:
+        z_list = [None] * xs.size
+
+    return [
+        CoordinatePoint.model_construct(index=i, x=x, y=y, z=z)
+        for i, (x, y, z) in enumerate(zip(xs.tolist(), ys.tolist(), z_list), start=1)
+    ]
 
 
 def _populate_lonlat(points: list[CoordinatePoint], source_epsg: int) -> None:
     """Transform projected x/y to WGS84 lon/lat in-place."""
-    transformer = Transformer.from_crs(f"EPSG:{source_epsg}", "EPSG:4326", always_xy=True)
-    xs = [p.x for p in points]
-    ys = [p.y for p in points]
+    transformer = get_transformer(source_epsg)
+    n = len(points)
+    xs = np.fromiter((p.x for p in points), dtype=np.float64, count=n)
+    ys = np.fromiter((p.y for p in points), dtype=np.float64, count=n)
     lons, lats = transformer.transform(xs, ys)
-    for p, lon, lat in zip(points, lons, lats):
+    for p, lon, lat in zip(points, lons.tolist(), lats.tolist()):
         p.lon = lon
         p.lat = lat
@@ -2,42 +2,115 @@
 
 import math
 
+import numpy as np
+
 from .models import CoordinatePoint, Segment
 
+EARTH_RADIUS_M = 6_371_000.0
+
+
+def haversine_lengths(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Great-circle distances in metres between consecutive lon/lat points.
+
+    Takes WGS84 coordinates in degrees and returns an array one shorter than
+    the inputs. Fully vectorized — a single pass of numpy ufuncs rather than
+    eight trig calls per point in a Python loop.
+    """
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2.0) ** 2
+    return EARTH_RADIUS_M * 2.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+
+
+def compute_segment_columns(points: list[CoordinatePoint]) -> dict[str, np.ndarray]:
+    """Compute segment data as a dict of parallel column arrays (SoA).
+
+    Keys match the ``Segment`` model fields, in field order. The z-derived
+    columns hold NaN where z is absent. This is the hot path — consumers
+    that only need bulk output (CSV export) can format the columns directly
+    without materializing per-segment objects.
+    """
+    n = len(points)
+    if n < 2:
+        empty_f = np.empty(0, dtype=np.float64)
+        empty_i = np.empty(0, dtype=np.int64)
+        return {
+            "segment": np.empty(0, dtype=np.str_),
+            "start_point": empty_i,
+            "end_point": empty_i,
+            "start_x": empty_f,
+            "start_y": empty_f,
+            "end_x": empty_f,
+            "end_y": empty_f,
+            "start_z": empty_f,
+            "end_z": empty_f,
+            "z_change": empty_f,
+            "length_m": empty_f,
+            "length_km": empty_f,
+            "cumulative_km_start": empty_f,
+            "cumulative_km_end": empty_f,
+        }
+
+    idx = np.fromiter((p.index for p in points), dtype=np.int64, count=n)
+    x = np.fromiter((p.x for p in points), dtype=np.float64, count=n)
+    y = np.fromiter((p.y for p in points), dtype=np.float64, count=n)
+    z = np.fromiter((p.z if p.z is not None else math.nan for p in points), dtype=np.float64, count=n)
+
+    lengths_m = np.hypot(np.diff(x), np.diff(y))
+    lengths_km = lengths_m / 1000.0
+    cum_end = np.cumsum(lengths_km)
+    cum_start = np.concatenate(([0.0], cum_end[:-1]))
+
+    start_str = idx[:-1].astype(np.str_)
+    end_str = idx[1:].astype(np.str_)
+
+    return {
+        "segment": np.char.add(np.char.add(start_str, " -> "), end_str),
+        "start_point": idx[:-1],
+        "end_point": idx[1:],
+        "start_x": x[:-1],
+        "start_y": y[:-1],
+        "end_x": x[1:],
+        "end_y": y[1:],
+        "start_z": z[:-1],
+        "end_z": z[1:],
+        "z_change": np.diff(z),
+        "length_m": lengths_m,
+        "length_km": lengths_km,
+        "cumulative_km_start": cum_start,
+        "cumulative_km_end": cum_end,
+    }
+
+
+def _none_if_nan(value: float) -> float | None:
+    return None if math.isnan(value) else value
+
 
 def compute_segments(points: list[CoordinatePoint]) -> list[Segment]:
     """Compute segments between consecutive points with distances and cumulative KP."""
-    segments: list[Segment] = []
-    cumulative_km = 0.0
-
-    for i in range(1, len(points)):
-        p1, p2 = points[i - 1], points[i]
-        dx = p2.x - p1.x
-        dy = p2.y - p1.y
-        length_m = math.hypot(dx, dy)
-        length_km = length_m / 1000
-
-        z_change = None
-        if p1.z is not None and p2.z is not None:
-            z_change = p2.z - p1.z
-
-        seg = Segment(
-            segment=f"{p1.index} -> {p2.index}",
-            start_point=p1.index,
-            end_point=p2.index,
-            start_x=p1.x,
-            start_y=p1.y,
-            end_x=p2.x,
-            end_y=p2.y,
-            start_z=p1.z,
-            end_z=p2.z,
-            z_change=z_change,
-            length_m=length_m,
-            length_km=length_km,
-            cumulative_km_start=cumulative_km,
-            cumulative_km_end=cumulative_km + length_km,
-        )
-        segments.append(seg)
-        cumulative_km += length_km
+    cols = compute_segment_columns(points)
+    lists = {name: col.tolist() for name, col in cols.items()}
 
-    return segments
+    # model_construct skips field validation — every value here is a
+    # plain float/int/str straight out of the numpy columns above
+    return [
+        Segment.model_construct(
+            segment=lists["segment"][i],
+            start_point=lists["start_point"][i],
+            end_point=lists["end_point"][i],
+            start_x=lists["start_x"][i],
+            start_y=lists["start_y"][i],
+            end_x=lists["end_x"][i],
+            end_y=lists["end_y"][i],
+            start_z=_none_if_nan(lists["start_z"][i]),
+            end_z=_none_if_nan(lists["end_z"][i]),
+            z_change=_none_if_nan(lists["z_change"][i]),
+            length_m=lists["length_m"][i],
+            length_km=lists["length_km"][i],
+            cumulative_km_start=lists["cumulative_km_start"][i],
+            cumulative_km_end=lists["cumulative_km_end"][i],
+        )
+        for i in range(len(lists["segment"]))
+    ]
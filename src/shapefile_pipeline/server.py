@@ -2,31 +2,84 @@
 
 from __future__ import annotations
 
-import csv
-import io
+import hashlib
+import shutil
 import tempfile
 import zipfile
+from collections import OrderedDict
 from pathlib import Path
 
-import shapefile
+import anyio.to_thread
+import msgpack
+import numpy as np
 from fastapi import FastAPI, HTTPException, Query, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 
-from .kml_reader import read_kmz
-from .models import PipelineResult, Segment
+from .kml_reader import read_kml, read_kmz
+from .models import PipelineResult
 from .reader import detect_crs, read_shapefile
-from .segments import compute_segments
+from .segments import compute_segment_columns, compute_segments
 
 app = FastAPI(title="Shapefile Pipeline", version="0.1.0")
 
+# Large CSV/JSON payloads are mostly digits and commas; level 1 keeps the
+# CPU cost low while still shrinking them several-fold on the wire
+app.add_middleware(GZipMiddleware, minimum_size=16384, compresslevel=1)
+
 REQUIRED_EXT = ".shp"
 COMPANION_EXTS = {".shp", ".shx", ".dbf", ".prj"}
 
+# Rows per streamed CSV chunk
+_CSV_BATCH = 1000
+
+# Below this many segments, build the CSV in memory and skip chunked encoding
+_CSV_STREAM_THRESHOLD = 4096
+
+# Copy buffer for streaming uploads to disk
+_COPY_CHUNK = 1 << 20
+
+# Zip uploads under this size are spooled in RAM instead of hitting disk
+_SPOOL_MAX = 16 << 20
+
+# Parsed (points, metadata) results keyed by upload content digest — repeated
+# uploads of the same file cost one hash instead of a full parse + reproject
+_RESULT_CACHE: OrderedDict[bytes, tuple] = OrderedDict()
+_RESULT_CACHE_MAX = 16
+
+
+def _update_digest(h, f) -> None:
+    """Feed a file object into a hasher in chunks, restoring position 0 (blocking)."""
+    f.seek(0)
+    while chunk := f.read(_COPY_CHUNK):
+        h.update(chunk)
+    f.seek(0)
+
 
-@app.post("/process")
+def _digest_fileobj(f) -> bytes:
+    """BLAKE2b content digest of a file object (blocking)."""
+    h = hashlib.blake2b(digest_size=16)
+    _update_digest(h, f)
+    return h.digest()
+
+
+def _cache_get(key: bytes):
+    result = _RESULT_CACHE.get(key)
+    if result is not None:
+        _RESULT_CACHE.move_to_end(key)
+    return result
+
+
+def _cache_put(key: bytes, result) -> None:
+    _RESULT_CACHE[key] = result
+    while len(_RESULT_CACHE) > _RESULT_CACHE_MAX:
+        _RESULT_CACHE.popitem(last=False)
+
+
+@app.post("/process", response_model=None)
 async def process_shapefile(
     files: list[UploadFile],
-    format: str = Query("csv", pattern="^(csv|json)$"),
+    format: str = Query("csv", pattern="^(csv|json|msgpack)$"),
 ):
     """Process uploaded shapefile(s) or KMZ/KML and return pipeline segments.
 
@@ -34,128 +87,262 @@ async def process_shapefile(
     - A single .kmz or .kml file
     - A single .zip containing shapefile components
     - Multiple files (.shp, .shx, .dbf, and optionally .prj)
-    """
-    filename = (files[0].filename or "").lower() if len(files) == 1 else ""
 
-    if filename.endswith((".kmz", ".kml")):
+    Single uploads are dispatched on their magic bytes rather than the
+    filename, so mangled or missing filenames (and KMZs renamed .zip)
+    still route to the right handler; the filename suffix is only
+    consulted as a tiebreaker when the peek is inconclusive.
+    """
+    head = b""
+    filename = ""
+    if len(files) == 1:
+        head = await files[0].read(4)
+        await files[0].seek(0)
+        filename = (files[0].filename or "").lower()
+
+    if head.startswith(b"PK\x03\x04"):
+        # KMZ and zipped shapefiles share the PK signature — peek at the
+        # member list to tell them apart
+        if await anyio.to_thread.run_sync(_classify_zip, files[0].file) == "kmz":
+            points, metadata = await _handle_kmz(files[0])
+        else:
+            points, metadata = await _handle_zip(files[0])
+    elif head.startswith(b"<") or filename.endswith(".kml"):
+        # The suffix check catches XML whose peek is defeated by a BOM or
+        # leading whitespace
+        points, metadata = await _handle_kml(files[0])
+    elif filename.endswith(".kmz"):
         points, metadata = await _handle_kmz(files[0])
     elif filename.endswith(".zip"):
         points, metadata = await _handle_zip(files[0])
     else:
         points, metadata = await _handle_multi_file(files)
 
-    segments = compute_segments(points)
-    result = PipelineResult(metadata=metadata, segments=segments)
-
     if format == "json":
-        return result
-
-    return _segments_to_csv_response(segments)
+        segments = compute_segments(points)
+        result = PipelineResult(metadata=metadata, segments=segments)
+        # model_dump_json serializes straight from the model in pydantic-core,
+        # skipping both the intermediate dict and FastAPI's response-model pass
+        return Response(result.model_dump_json(), media_type="application/json")
+
+    # csv/msgpack never need per-segment objects — work on the column arrays
+    cols = compute_segment_columns(points)
+    if format == "msgpack":
+        return _columns_to_msgpack_response(metadata, cols)
+    return _columns_to_csv_response(cols)
+
+
+def _classify_zip(f) -> str:
+    """Classify a PK-zip upload as "shapefile" or "kmz" (blocking).
+
+    Reads only the central directory and restores position 0, so the
+    downstream handler's digest/cache flow is unaffected. A .shp member
+    wins over a .kml one — zipped shapefile exports often carry an
+    incidental .kml preview — and a zip with neither routes to the
+    shapefile handler for its missing-.shp error.
+    """
+    f.seek(0)
+    with zipfile.ZipFile(f) as zf:
+        names = [name.lower() for name in zf.namelist()]
+    f.seek(0)
+    if any(name.endswith(".shp") for name in names):
+        return "shapefile"
+    if any(name.endswith(".kml") for name in names):
+        return "kmz"
+    return "shapefile"
+
+
+def _extract_shapefile_members(archive, extract_dir: str) -> str | None:
+    """Extract the .shp and its companions from an open zip file (blocking).
+
+    Single pass over the central directory: find the .shp, then extract only
+    the members sharing its basename with a known companion extension.
+    Returns the extracted .shp path, or None if the archive contains no .shp.
+    """
+    shp_path = None
+    with zipfile.ZipFile(archive) as zf:
+        infos = zf.infolist()
+        shp_info = next((i for i in infos if i.filename.lower().endswith(".shp")), None)
+        if shp_info is None:
+            return None
+
+        shp_stem = Path(shp_info.filename).stem
+        for info in infos:
+            member = Path(info.filename)
+            if member.stem == shp_stem and member.suffix.lower() in COMPANION_EXTS:
+                # extract() sanitizes hostile member names (absolute paths,
+                # ".." traversal) — use the path it actually wrote rather
+                # than re-joining the untrusted archive name
+                extracted = zf.extract(info, extract_dir)
+                if info is shp_info:
+                    shp_path = extracted
+    return shp_path
 
 
 async def _handle_zip(upload: UploadFile):
-    """Extract shapefile from a zip archive and process it."""
-    content = await upload.read()
-    with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as tmp:
-        tmp.write(content)
-        tmp_path = Path(tmp.name)
+    """Extract shapefile from a zip archive and process it.
 
-    try:
-        # Extract .prj WKT if present in the zip
-        prj_wkt = None
-        with zipfile.ZipFile(tmp_path) as zf:
-            for name in zf.namelist():
-                if name.lower().endswith(".prj"):
-                    prj_wkt = zf.read(name).decode("utf-8", errors="replace")
-                    break
-
-        # pyshp can read directly from zip paths
-        shp_name = None
-        with zipfile.ZipFile(tmp_path) as zf:
-            for name in zf.namelist():
-                if name.lower().endswith(".shp"):
-                    shp_name = name
-                    break
-
-        if shp_name is None:
-            raise HTTPException(status_code=400, detail="No .shp file found in zip archive")
-
-        # Read using pyshp's zip support: "zip://path.zip/shapefile.shp" -- but
-        # that syntax may not be reliable, so extract to temp dir instead
-        with zipfile.ZipFile(tmp_path) as zf:
-            extract_dir = tempfile.mkdtemp()
-            zf.extractall(extract_dir)
-
-        # Find the .shp in extracted dir
-        shp_files = list(Path(extract_dir).rglob("*.shp"))
-        if not shp_files:
-            raise HTTPException(status_code=400, detail="No .shp file found in zip archive")
-
-        shp_path = shp_files[0]
-        return read_shapefile(shp_path)
-    finally:
-        tmp_path.unlink(missing_ok=True)
+    All blocking work — the copy, the zip extraction, and the shapefile
+    parse — runs in the threadpool so the event loop keeps serving other
+    requests.
+    """
+    await upload.seek(0)
+    key = await anyio.to_thread.run_sync(_digest_fileobj, upload.file)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    # Spool the archive: typical shapefile zips stay in RAM, larger uploads
+    # roll over to disk transparently
+    extract_dir = tempfile.mkdtemp()
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX) as tmp:
+        await anyio.to_thread.run_sync(shutil.copyfileobj, upload.file, tmp, _COPY_CHUNK)
+        tmp.seek(0)
+        shp_path = await anyio.to_thread.run_sync(_extract_shapefile_members, tmp, extract_dir)
+
+    if shp_path is None:
+        raise HTTPException(status_code=400, detail="No .shp file found in zip archive")
+
+    result = await anyio.to_thread.run_sync(read_shapefile, shp_path)
+    _cache_put(key, result)
+    return result
+
+
+async def _parse_upload_cached(upload: UploadFile, parser):
+    """Digest the upload, consult the result cache, else parse in the threadpool.
+
+    The parser receives the upload's spooled file directly — no extra copy.
+    """
+    await upload.seek(0)
+    key = await anyio.to_thread.run_sync(_digest_fileobj, upload.file)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    result = await anyio.to_thread.run_sync(parser, upload.file)
+    _cache_put(key, result)
+    return result
 
 
 async def _handle_kmz(upload: UploadFile):
-    """Process a KMZ or KML file upload."""
-    content = await upload.read()
-    return read_kmz(io.BytesIO(content))
+    """Process a KMZ file upload."""
+    return await _parse_upload_cached(upload, read_kmz)
+
+
+async def _handle_kml(upload: UploadFile):
+    """Process a plain KML upload — the payload is known to be XML, so skip
+    read_kmz's zip sniffing."""
+    return await _parse_upload_cached(upload, read_kml)
 
 
 async def _handle_multi_file(files: list[UploadFile]):
-    """Process shapefile from multiple uploaded component files."""
-    file_map: dict[str, bytes] = {}
-    for f in files:
-        ext = Path(f.filename or "").suffix.lower()
-        if ext in COMPANION_EXTS:
-            file_map[ext] = await f.read()
-
-    if ".shp" not in file_map:
-        raise HTTPException(status_code=400, detail="Missing required .shp file")
-
-    shp_file = io.BytesIO(file_map[".shp"])
-    shx_file = io.BytesIO(file_map[".shx"]) if ".shx" in file_map else None
-    dbf_file = io.BytesIO(file_map[".dbf"]) if ".dbf" in file_map else None
-
-    prj_wkt = None
-    if ".prj" in file_map:
-        prj_wkt = file_map[".prj"].decode("utf-8", errors="replace")
-
-    return read_shapefile(
-        shp_file=shp_file,
-        shx_file=shx_file,
-        dbf_file=dbf_file,
-        prj_wkt=prj_wkt,
+    """Process shapefile from multiple uploaded component files.
+
+    Components are streamed to a temp dir under a common stem and read from
+    disk by pyshp, so peak memory stays at the copy-buffer size rather than
+    the sum of the uploads.
+    """
+    components = sorted(
+        ((ext, f) for f in files if (ext := Path(f.filename or "").suffix.lower()) in COMPANION_EXTS),
+        key=lambda pair: pair[0],
     )
 
+    # Digest the concatenated components (sorted by extension) for the cache key
+    hasher = hashlib.blake2b(digest_size=16)
+    for _, f in components:
+        await f.seek(0)
+        await anyio.to_thread.run_sync(_update_digest, hasher, f.file)
+    key = hasher.digest()
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    upload_dir = Path(tempfile.mkdtemp())
+    try:
+        seen = {ext for ext, _ in components}
+        if ".shp" not in seen:
+            raise HTTPException(status_code=400, detail="Missing required .shp file")
 
-def _segments_to_csv_response(segments: list[Segment]) -> StreamingResponse:
-    """Convert segments to a streaming CSV response."""
-    fieldnames = [
-        "segment", "start_point", "end_point",
-        "start_x", "start_y", "end_x", "end_y",
-        "start_z", "end_z", "z_change",
-        "length_m", "length_km",
-        "cumulative_km_start", "cumulative_km_end",
-    ]
-
-    def generate():
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=fieldnames)
-        writer.writeheader()
-        yield buf.getvalue()
-        buf.seek(0)
-        buf.truncate(0)
-
-        for seg in segments:
-            writer.writerow(seg.model_dump())
-            yield buf.getvalue()
-            buf.seek(0)
-            buf.truncate(0)
-
-    return StreamingResponse(
-        generate(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=pipeline_segments.csv"},
-    )
+        for ext, f in components:
+            await f.seek(0)
+            with open(upload_dir / f"upload{ext}", "wb") as out:
+                await anyio.to_thread.run_sync(shutil.copyfileobj, f.file, out, _COPY_CHUNK)
+
+        result = await anyio.to_thread.run_sync(read_shapefile, upload_dir / "upload")
+        _cache_put(key, result)
+        return result
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+_CSV_FIELDNAMES = [
+    "segment", "start_point", "end_point",
+    "start_x", "start_y", "end_x", "end_y",
+    "start_z", "end_z", "z_change",
+    "length_m", "length_km",
+    "cumulative_km_start", "cumulative_km_end",
+]
+_CSV_HEADER = ",".join(_CSV_FIELDNAMES) + "\n"
+
+
+def _format_rows(cols: dict[str, np.ndarray]) -> np.ndarray:
+    """Render segment columns into an array of CSV row strings.
+
+    Each column converts to strings in one vectorized pass (str() of a float
+    round-trips, matching the old per-row f-strings); NaN cells in float
+    columns become empty, preserving the optional-z convention. No value
+    contains commas or quotes, so plain joining is safe.
+    """
+    rendered = []
+    for name in _CSV_FIELDNAMES:
+        col = cols[name]
+        cells = col.astype(np.str_)
+        if col.dtype.kind == "f":
+            cells = np.where(np.isnan(col), "", cells)
+        rendered.append(cells)
+
+    rows = rendered[0]
+    for cells in rendered[1:]:
+        rows = np.char.add(np.char.add(rows, ","), cells)
+    return rows
+
+
+def _columns_to_csv_response(cols: dict[str, np.ndarray]) -> Response:
+    """Convert segment columns to a CSV response.
+
+    Small results are returned whole — streaming only pays off once the
+    payload is large enough to be worth chunked encoding.
+    """
+    headers = {"Content-Disposition": "attachment; filename=pipeline_segments.csv"}
+    rows = _format_rows(cols)
+
+    if rows.size < _CSV_STREAM_THRESHOLD:
+        payload = _CSV_HEADER + "".join(f"{row}\n" for row in rows.tolist())
+        return PlainTextResponse(payload, media_type="text/csv", headers=headers)
+
+    # Async so Starlette streams chunks directly on the event loop instead of
+    # bouncing each one through its threadpool; batching amortizes per-yield
+    # overhead across rows.
+    async def generate():
+        yield _CSV_HEADER
+        for start in range(0, rows.size, _CSV_BATCH):
+            yield "\n".join(rows[start : start + _CSV_BATCH].tolist()) + "\n"
+
+    return StreamingResponse(generate(), media_type="text/csv", headers=headers)
+
+
+def _columns_to_msgpack_response(metadata, cols: dict[str, np.ndarray]) -> Response:
+    """Pack segment columns as raw float64 buffers in a msgpack map.
+
+    Numeric values are copied byte-for-byte into msgpack bin fields instead
+    of being stringified, so a 65k-segment payload costs a handful of
+    memcpys. The string "segment" labels are derivable from start/end_point
+    and are not shipped.
+    """
+    columns = {
+        name: np.ascontiguousarray(col, dtype=np.float64).tobytes()
+        for name, col in cols.items()
+        if col.dtype.kind != "U"
+    }
+    payload = msgpack.packb({"metadata": metadata.model_dump(), "columns": columns})
+    return Response(payload, media_type="application/vnd.msgpack")
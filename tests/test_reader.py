@@ -5,7 +5,7 @@ import zipfile
 
 import pytest
 
-from shapefile_pipeline import read_shapefile, read_kmz, compute_segments
+from shapefile_pipeline import read_shapefile, read_kml, read_kmz, compute_segments, haversine_lengths
 
 
 class TestPointZShapefile:
@@ -133,6 +133,32 @@ class TestKmlInline:
         assert meta.has_z is False
         assert all(p.z is None for p in points)
 
+    KML_MIXED_ARITY = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <Placemark>
+      <LineString>
+        <coordinates>1,2,3 4,5 6,7 8,9</coordinates>
+      </LineString>
+    </Placemark>
+  </Document>
+</kml>"""
+
+    def test_mixed_arity_tuples(self):
+        # 9 values over 4 tuples reshapes cleanly to 3x3 — the parser must
+        # notice the row count mismatch and fall back to per-token parsing
+        points, _ = read_kmz(io.BytesIO(self.KML_MIXED_ARITY.encode()))
+        assert len(points) == 4
+        assert (points[0].x, points[0].y, points[0].z) == (1.0, 2.0, 3.0)
+        assert (points[1].x, points[1].y, points[1].z) == (4.0, 5.0, None)
+        assert (points[3].x, points[3].y) == (8.0, 9.0)
+
+    def test_read_kml_direct(self):
+        points, meta = read_kml(io.BytesIO(self.KML_LINESTRING.encode()))
+        assert meta.shape_type_name == "KML_LINESTRING"
+        assert len(points) == 3
+
     def test_kmz_from_bytes(self):
         buf = io.BytesIO()
         with zipfile.ZipFile(buf, "w") as zf:
@@ -149,3 +175,15 @@ class TestKmlInline:
         assert segments[0].z_change == -10  # -20 - (-10)
         assert segments[0].cumulative_km_start == 0.0
         assert segments[1].cumulative_km_end > segments[1].cumulative_km_start
+
+
+class TestHaversine:
+    def test_one_degree_of_latitude(self):
+        lengths = haversine_lengths([0.0, 0.0], [0.0, 1.0])
+        assert lengths.shape == (1,)
+        assert 111_000 < lengths[0] < 111_400  # ~111.2 km per degree
+
+    def test_consecutive_distances(self):
+        lengths = haversine_lengths([-3.5, -3.4, -3.3], [53.5, 53.6, 53.7])
+        assert lengths.shape == (2,)
+        assert all(lengths > 0)
@@ -4,6 +4,8 @@ import io
 import zipfile
 from pathlib import Path
 
+import msgpack
+import numpy as np
 import pytest
 from httpx import ASGITransport, AsyncClient
 
@@ -68,6 +70,54 @@ class TestShapefileUpload:
         assert resp.status_code == 200
         assert len(resp.json()["segments"]) == 285
 
+    async def test_zip_with_stray_kml_member(self, client):
+        # A zipped shapefile carrying an incidental .kml preview must still
+        # route to the shapefile handler
+        base = SAMPLEDATA / "spirit" / "MNZ_Export" / "MNZ_Export_Line"
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            for ext in (".shp", ".shx", ".dbf", ".prj"):
+                p = base.with_suffix(ext)
+                zf.writestr(p.name, p.read_bytes())
+            zf.writestr("preview.kml", "<kml></kml>")
+        files = [("files", ("export.zip", buf.getvalue(), "application/zip"))]
+        resp = await client.post("/process?format=json", files=files)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["metadata"]["shape_type_name"] == "POLYLINEZ"
+        assert len(data["segments"]) == 285
+
+    async def test_zip_with_traversal_member_names(self, client):
+        # Hostile member names must be sanitized into the extract dir, not
+        # resolved against the server filesystem
+        base = SAMPLEDATA / "spirit" / "MNZ_Export" / "MNZ_Export_Line"
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            for ext in (".shp", ".shx", ".dbf", ".prj"):
+                p = base.with_suffix(ext)
+                zf.writestr("../" + p.name, p.read_bytes())
+        files = [("files", ("archive.zip", buf.getvalue(), "application/zip"))]
+        resp = await client.post("/process?format=json", files=files)
+        assert resp.status_code == 200
+        assert len(resp.json()["segments"]) == 285
+
+    async def test_multi_file_msgpack(self, client):
+        base = SAMPLEDATA / "spirit" / "MNZ_Export" / "MNZ_Export_Line"
+        files = [
+            ("files", _upload(base.with_suffix(".shp"))),
+            ("files", _upload(base.with_suffix(".shx"))),
+            ("files", _upload(base.with_suffix(".dbf"))),
+            ("files", _upload(base.with_suffix(".prj"))),
+        ]
+        resp = await client.post("/process?format=msgpack", files=files)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/vnd.msgpack"
+        data = msgpack.unpackb(resp.content)
+        assert data["metadata"]["crs_epsg"] == 23030
+        lengths = np.frombuffer(data["columns"]["length_m"], dtype=np.float64)
+        assert lengths.shape == (285,)
+        assert (lengths > 0).all()
+
     async def test_missing_shp_returns_400(self, client):
         base = SAMPLEDATA / "spirit" / "KP_Points" / "KP_Points_1m"
         files = [("files", _upload(base.with_suffix(".dbf")))]
@@ -113,3 +163,22 @@ class TestKmzUpload:
         assert resp.status_code == 200
         data = resp.json()
         assert len(data["segments"]) == 2
+
+    async def test_kml_upload_with_bom(self, client):
+        # A UTF-8 BOM defeats the magic-byte peek; the .kml suffix must
+        # still route the upload to the KML handler
+        kml = """\
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <Placemark>
+      <LineString>
+        <coordinates>0,0,0 1,1,10 2,2,20</coordinates>
+      </LineString>
+    </Placemark>
+  </Document>
+</kml>"""
+        body = b"\xef\xbb\xbf" + kml.encode()
+        files = [("files", ("route.kml", body, "application/vnd.google-earth.kml+xml"))]
+        resp = await client.post("/process?format=json", files=files)
+        assert resp.status_code == 200
+        assert len(resp.json()["segments"]) == 2